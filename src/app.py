@@ -1,14 +1,28 @@
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, DiskcacheManager
 import dash_bootstrap_components as dbc
 from dash import dash_table
+from dash.exceptions import PreventUpdate
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import plotly.express as px
+import diskcache
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import httpx
-import json
+import io
+import orjson
 import logging
 import os
+import random
+import psutil
+import tempfile
+import threading
+import time
 from dotenv import load_dotenv
+from tenacity import Retrying, retry_if_exception, stop_after_attempt
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,8 +32,15 @@ config = {
     "openai_api_key": os.getenv("OPENAI_API_KEY"),  # Load API key from environment variable
     "openai_endpoint": "https://api.openai.com/v1/chat/completions",
     "file_path": 'https://github.com/rmejia41/open_datasets/raw/main/StateHighestAnnualAverageFluoride.csv',
+    "cache_path": os.path.join(tempfile.gettempdir(), "fluoride.parquet"),  # Shared by all workers on the host
+    "cache_ttl": 3600,  # Seconds before the cached copy is revalidated against file_path
+    "feedback_ttl": 24 * 3600,  # Seconds generated feedback and prefetch markers stay in callback_cache
+    "download_timeout": 5.0,  # Seconds to wait for file_path before falling back to the cached copy
+    "callback_cache_dir": "./cache",  # Background-callback results, feedback text and prefetch bookkeeping
     "timeout": 30.0,
-    "retry_attempts": 3
+    "retry_attempts": 3,
+    "rate_limit": 30,  # Requests per second allowed across all processes on the host
+    "max_concurrency": 10  # Requests in flight at once per process
 }
 
 # Check if API key is loaded
@@ -27,9 +48,144 @@ if config["openai_api_key"] is None:
     raise EnvironmentError(
         "OpenAI API key not found. Please set the OPENAI_API_KEY environment variable in the .env file.")
 
+
+# Shared by every worker and background-callback process on the host: feedback text, prefetch bookkeeping, the
+# rate-limit bucket and Dash's job state. In-process caches do not survive a background job's exit, so anything
+# that must be reused across callbacks is stored here.
+callback_cache = diskcache.Cache(config["callback_cache_dir"])
+
+class ReleasingStream(httpx.SyncByteStream):
+    """Response body wrapper that calls release once the body has been read and closed."""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            if self.release is not None:
+                self.release()
+                self.release = None
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """Token-bucket transport that paces and caps outgoing requests so bursts do not trigger 429s.
+
+    The bucket lives in a shared diskcache so every worker and background-callback process on the host draws
+    from the same budget. The concurrency cap is per process and holds a slot until the response body closes.
+    """
+
+    bucket_key = "rate-limit-bucket"
+
+    def __init__(self, transport, cache, rate, max_concurrency):
+        self.transport = transport
+        self.cache = cache
+        self.rate = rate
+        self.concurrency = threading.BoundedSemaphore(max_concurrency)
+
+    def _acquire_token(self):
+        while True:
+            with self.cache.transact():
+                now = time.time()
+                tokens, updated = self.cache.get(self.bucket_key, (float(self.rate), now))
+                tokens = min(self.rate, tokens + max(0.0, now - updated) * self.rate)
+                if tokens >= 1:
+                    self.cache.set(self.bucket_key, (tokens - 1, now))
+                    return
+                self.cache.set(self.bucket_key, (tokens, now))
+                delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+
+    def handle_request(self, request):
+        self._acquire_token()
+        self.concurrency.acquire()
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            self.concurrency.release()
+            raise
+        response.stream = ReleasingStream(response.stream, self.concurrency.release)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+# Shared HTTP/2 client so the TLS session to the OpenAI endpoint is reused across requests
+def make_http_client():
+    transport = httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=10, max_connections=20)
+    )
+    return httpx.Client(
+        timeout=config["timeout"],
+        transport=RateLimitedTransport(transport, callback_cache, config["rate_limit"], config["max_concurrency"])
+    )
+
+
+def reset_http_client():
+    # Forked background-callback processes must not write to the parent's pooled TLS connections,
+    # so the inherited client is abandoned (not closed) and replaced. Each update_charts job is a fresh
+    # fork, so its OpenAI call opens a new connection; pooled sessions are only reused by the server
+    # process's prefetch threads and by retries within one job.
+    global http_client
+    http_client = make_http_client()
+
+
+http_client = make_http_client()
+os.register_at_fork(after_in_child=reset_http_client)
+
 # === Initialize Data and Logging ===
 logging.basicConfig(level=logging.INFO)
-fluoride_data = pd.read_csv(config['file_path'])
+
+
+def load_fluoride_data(url, cache_path, ttl):
+    """Load the fluoride CSV through a local Parquet copy, revalidated with the server's ETag once ttl expires."""
+    etag_path = cache_path + ".etag"
+    cached = os.path.exists(cache_path)
+    if cached and time.time() - os.path.getmtime(cache_path) < ttl:
+        return pd.read_parquet(cache_path, dtype_backend='pyarrow')
+
+    headers = {}
+    if cached and os.path.exists(etag_path):
+        with open(etag_path) as f:
+            headers["If-None-Match"] = f.read().strip()
+
+    try:
+        # One-off download: bypasses the rate-limited OpenAI client and fails fast when the host is unreachable
+        response = httpx.get(url, headers=headers, follow_redirects=True, timeout=config["download_timeout"])
+        if response.status_code == 304:
+            os.utime(cache_path)
+            return pd.read_parquet(cache_path, dtype_backend='pyarrow')
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        if not cached:
+            raise
+        logging.warning(f"Could not revalidate {url}, using cached copy: {e}")
+        # Treat the copy as fresh for another ttl so each worker start does not retry the unreachable host
+        os.utime(cache_path)
+        return pd.read_parquet(cache_path, dtype_backend='pyarrow')
+
+    data = pd.read_csv(io.BytesIO(response.content), dtype_backend='pyarrow')
+    # Write to a per-process temp file first so concurrent workers never read a partial file
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+    etag = response.headers.get("ETag")
+    if etag:
+        with open(etag_path, "w") as f:
+            f.write(etag)
+    elif os.path.exists(etag_path):
+        os.remove(etag_path)
+    return data
+
+
+fluoride_data = load_fluoride_data(config['file_path'], config['cache_path'], config['cache_ttl'])
 
 # Mapping and data preparation
 state_abbreviations = {
@@ -46,10 +202,40 @@ state_abbreviations = {
     "DC": "District of Columbia"
 }
 
-fluoride_data['State Name'] = fluoride_data['State'].map(state_abbreviations)
+# Fixed state alphabet: a code's position in state_codes is also its categorical code in fluoride_data
+state_codes = tuple(sorted(state_abbreviations))
+state_names = tuple(state_abbreviations[code] for code in state_codes)
+state_index = {code: idx for idx, code in enumerate(state_codes)}
+
+# Categorical state codes let the per-callback State filter compare int8 codes instead of strings
+fluoride_data['State'] = pd.Categorical(fluoride_data['State'], categories=state_codes)
+fluoride_data['State Name'] = fluoride_data['State'].cat.rename_categories(state_abbreviations)
 fluoride_data['Highest Adjusted CWS Monthly Fluoride Average'] = fluoride_data[
     'Highest Adjusted CWS Monthly Fluoride Average'].fillna(0)
 
+# Sort by state code so each state's rows form one contiguous slice; FP32 is ample for mg/L at 2 decimals
+fluoride_data = fluoride_data.sort_values('State', kind='stable', na_position='first', ignore_index=True)
+state_starts = np.searchsorted(fluoride_data['State'].cat.codes.to_numpy(), np.arange(len(state_codes) + 1))
+fluoride_values = fluoride_data['Highest Adjusted CWS Monthly Fluoride Average'].to_numpy(np.float32)
+
+# Precompute per-state and per-(state, year) lookups once, since fluoride_data never changes after load
+state_records = {}  # state -> table records for all years
+state_latest_year = {}  # state -> most recent year with data
+state_year_data = {}  # (state, year) -> rows for that year
+state_year_stats = {}  # (state, year) -> (max_fluoride, avg_fluoride, cws_name)
+for state, state_group in fluoride_data.groupby('State', observed=True):
+    start, stop = state_starts[state_index[state]:state_index[state] + 2]
+    avg_fluoride = float(fluoride_values[start:stop].mean())
+    state_records[state] = pa.Table.from_pandas(state_group, preserve_index=False).to_pylist()
+    state_latest_year[state] = state_group['Year'].max()
+    for year, year_group in state_group.groupby('Year'):
+        state_year_data[(state, year)] = year_group
+        state_year_stats[(state, year)] = (
+            year_group['Highest Adjusted CWS Monthly Fluoride Average'].max(),
+            avg_fluoride,
+            year_group['CWS Adjusted Name'].iat[0]
+        )
+
 # State-specific guidelines
 state_guidelines = {
     "Alabama": "https://www.alabamapublichealth.gov/oralhealth/fluoridation.html",
@@ -107,18 +293,127 @@ state_guidelines = {
 
 
 # === AI Feedback Handler Class ===
+# Set by update_charts to receive partial completions while a response streams in
+feedback_progress = contextvars.ContextVar("feedback_progress", default=None)
+
+
+def process_alive(pid):
+    # A killed background job stays a zombie until Dash reaps it, so zombies count as gone
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+class FeedbackError(Exception):
+    """Raised when feedback could not be generated; the message is shown to the user."""
+
+
+def is_retryable(exc):
+    """Retry transport failures, timeouts, conflicts, rate limits and server errors; other client errors are final."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status in (408, 409, 429) or status >= 500
+    return isinstance(exc, httpx.RequestError)
+
+
+def backoff_delay(attempt):
+    """Exponential backoff from 0.5s capped at 8s, jittered to 0.5-1.5x so retries from many clients spread out."""
+    return min(8.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+
+
+def wait_for_retry(retry_state):
+    """Wait as long as a 429/503's Retry-After asks (capped at the request timeout), else back off exponentially."""
+    delay = backoff_delay(retry_state.attempt_number - 1)
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in (429, 503):
+        try:
+            return max(0.0, min(float(exc.response.headers.get("Retry-After", delay)), config["timeout"]))
+        except ValueError:
+            pass
+    return delay
+
+
+def log_failed_attempt(retry_state):
+    logging.error(f"Request failed on attempt {retry_state.attempt_number}: {retry_state.outcome.exception()}")
+
+
 class AIFeedbackGenerator:
-    def __init__(self, api_key, endpoint, timeout=30, retries=3):
+    def __init__(self, api_key, endpoint, cache, timeout=30, retries=3, feedback_ttl=None):
         self.api_key = api_key
         self.endpoint = endpoint
+        self.cache = cache
         self.timeout = timeout
         self.retries = retries
+        self.feedback_ttl = feedback_ttl
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
 
+    @staticmethod
+    def _cache_key(state_name, year, max_fluoride, avg_fluoride, cws_name):
+        # Round the floats so near-identical selections share a cache entry; the prompt only shows 2 decimals.
+        # Plain Python types keep the pickled shared-cache key identical whether values come from numpy or JSON.
+        return (str(state_name), int(year), round(float(max_fluoride), 2), round(float(avg_fluoride), 2),
+                str(cws_name))
+
+    def has_cached_feedback(self, state_name, year, max_fluoride, avg_fluoride, cws_name):
+        key = self._cache_key(state_name, year, max_fluoride, avg_fluoride, cws_name)
+        return ("feedback",) + key in self.cache
+
     def generate_feedback(self, state_name, year, max_fluoride, avg_fluoride, cws_name):
+        key = self._cache_key(state_name, year, max_fluoride, avg_fluoride, cws_name)
+        try:
+            return self._generate_cached(*key)
+        except FeedbackError as e:
+            return str(e)
+
+    @functools.lru_cache(maxsize=512)
+    def _generate_cached(self, *key):
+        # The lru_cache only helps within one process; the shared cache is what background jobs and other
+        # workers see.
+        feedback_key = ("feedback",) + key
+        feedback = self.cache.get(feedback_key)
+        if feedback is not None:
+            return feedback
+
+        # Single-flight across threads and processes (prefetch vs. background job, concurrent users): the
+        # lock holder calls OpenAI and the others wait, then read its result. Failures are not stored, so a
+        # waiter that finds no result after the holder is done simply tries itself.
+        lock_key = ("feedback-lock",) + key
+        claimed = self._wait_for_lock(lock_key, feedback_key)
+        try:
+            feedback = self.cache.get(feedback_key)
+            if feedback is None:
+                feedback = self._generate(*key)
+                self.cache.set(feedback_key, feedback, expire=self.feedback_ttl)
+        finally:
+            if claimed:
+                with self.cache.transact():
+                    if self.cache.get(lock_key) == os.getpid():
+                        self.cache.delete(lock_key)
+        return feedback
+
+    def _wait_for_lock(self, lock_key, feedback_key):
+        """Claim lock_key for this process; return False instead if the result appears or the wait runs out."""
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while True:
+            if self.cache.add(lock_key, os.getpid(), expire=self.timeout * (self.retries + 1)):
+                return True
+            # Dash SIGKILLs superseded background jobs, which never release their lock; take it over
+            with self.cache.transact():
+                owner = self.cache.get(lock_key)
+                if owner is not None and not process_alive(owner):
+                    self.cache.set(lock_key, os.getpid(), expire=self.timeout * (self.retries + 1))
+                    return True
+            if feedback_key in self.cache or time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def _generate(self, state_name, year, max_fluoride, avg_fluoride, cws_name):
         guideline_link = state_guidelines.get(state_name, None)
         if guideline_link:
             additional_info = f"For specific state guidelines, refer to: {guideline_link}."
@@ -135,44 +430,118 @@ class AIFeedbackGenerator:
         )
 
         payload = {
-            "model": "gpt-4",
+            "model": "gpt-4o-mini",
             "messages": [
                 {"role": "system", "content": "You are an assistant for public health data summaries."},
                 {"role": "user", "content": prompt}
             ],
-            "max_tokens": 350
+            "max_tokens": 180,
+            "stream": True
         }
 
-        for attempt in range(self.retries):
-            try:
-                with httpx.Client(verify=False, timeout=self.timeout) as client:
-                    response = client.post(self.endpoint, headers=self.headers, data=json.dumps(payload))
-                response.raise_for_status()
-                completion = response.json()["choices"][0]["message"]["content"].strip()
-                return completion
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 401:
-                    logging.error("Unauthorized access - check your API key.")
-                    return "Error: Unauthorized access. Please check your API key."
-                else:
-                    logging.error(f"HTTP error on attempt {attempt + 1}: {e}")
-            except httpx.RequestError as e:
-                logging.error(f"Request error on attempt {attempt + 1}: {e}")
-            except httpx.TimeoutException:
-                logging.error(f"Timeout on attempt {attempt + 1}")
-
-        return "Feedback generation failed after multiple attempts."
+        retrying = Retrying(
+            retry=retry_if_exception(is_retryable),
+            wait=wait_for_retry,
+            stop=stop_after_attempt(self.retries),
+            after=log_failed_attempt,
+            reraise=True
+        )
+        # Raised rather than returned so failures are never memoized.
+        try:
+            return retrying(self._stream_completion, payload)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 401:
+                logging.error("Unauthorized access - check your API key.")
+                raise FeedbackError("Error: Unauthorized access. Please check your API key.")
+            if not is_retryable(e):
+                logging.error(f"AI service rejected the request with status {e.response.status_code}.")
+                raise FeedbackError("Feedback generation failed: the AI service rejected the request.")
+            raise FeedbackError("Feedback generation failed after multiple attempts.")
+        except httpx.RequestError:
+            raise FeedbackError("Feedback generation failed after multiple attempts.")
+
+    def _stream_completion(self, payload):
+        # Read the server-sent event stream, reporting the text so far to any progress callback
+        on_progress = feedback_progress.get()
+        chunks = []
+        with http_client.stream("POST", self.endpoint, headers=self.headers, content=orjson.dumps(payload),
+                                timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                try:
+                    event = orjson.loads(line[len("data: "):])
+                except orjson.JSONDecodeError:
+                    logging.error(f"Malformed event in completion stream: {line}")
+                    raise FeedbackError("Feedback generation failed: the AI service sent a malformed response.")
+                if not isinstance(event, dict) or "error" in event:
+                    logging.error(f"Error event in completion stream: {event}")
+                    raise FeedbackError("Feedback generation failed: the AI service reported an error.")
+                choices = event.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    chunks.append(delta)
+                    if on_progress is not None:
+                        on_progress("".join(chunks))
+        return "".join(chunks).strip()
 
 
 # Initialize the AI feedback generator with API key
 ai_feedback_generator = AIFeedbackGenerator(
     api_key=config["openai_api_key"],
     endpoint=config["openai_endpoint"],
+    cache=callback_cache,
     timeout=config["timeout"],
-    retries=config["retry_attempts"]
+    retries=config["retry_attempts"],
+    feedback_ttl=config["feedback_ttl"]
+)
+
+# Background workers for speculative feedback requests issued before both dropdowns are set
+prefetch_executor = ThreadPoolExecutor(max_workers=4)
+
+empty_map = px.choropleth(scope="usa").to_dict()
+select_prompt = "Select a year and state to view data."
+
+
+def build_map(state_data_for_year):
+    return px.choropleth(
+        state_data_for_year, locations="State", locationmode="USA-states",
+        color="Highest Adjusted CWS Monthly Fluoride Average",
+        hover_name="State Name", scope="usa"
+    ).update_layout(height=450, geo=dict(projection_scale=1.2), showlegend=False).to_dict()
+
+
+# Every (state, year) map has the same layout and trace settings; only the trace arrays differ. One Plotly build
+# serves as the template and the rest are filled in here at load, so forked background jobs inherit them all.
+no_data_map = build_map(fluoride_data.iloc[:0])
+map_figures = {}
+if state_year_data:
+    map_template = build_map(next(iter(state_year_data.values())))
+    for key, year_group in state_year_data.items():
+        trace = dict(
+            map_template['data'][0],
+            locations=year_group['State'].astype(str).tolist(),
+            hovertext=year_group['State Name'].astype(str).tolist(),
+            z=year_group['Highest Adjusted CWS Monthly Fluoride Average'].tolist()
+        )
+        map_figures[key] = {'data': [trace], 'layout': map_template['layout']}
+
+
+# Dropdown options are fixed for the life of the process
+year_options = [{'label': year, 'value': year} for year in sorted(fluoride_data['Year'].dropna().unique())]
+state_options = sorted(
+    ({'label': state_names[state_index[state]], 'value': state} for state in fluoride_data['State'].dropna().unique()),
+    key=lambda option: option['label']
 )
 
+
 # === Dash App Initialization ===
+# update_charts runs as a background callback so the OpenAI wait does not hold a server worker.
+# Callback results are not cached (no cache_by): a failure message would be stored and replayed for that
+# selection. Repeat selections are served by the shared ("feedback", ...) entries, which only hold successes.
+background_callback_manager = DiskcacheManager(callback_cache)
+
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX])
 server = app.server
 
@@ -183,21 +552,21 @@ app.layout = dbc.Container([
     dbc.Row([
         dbc.Col([html.Label("Select Year"), dcc.Dropdown(
             id='year-dropdown',
-            options=[{'label': year, 'value': year} for year in fluoride_data['Year'].unique()],
+            options=year_options,
             value=None, clearable=True
         )], width=6),
         dbc.Col([html.Label("Select State"), dcc.Dropdown(
             id='state-dropdown',
-            options=[{'label': state_abbreviations[state], 'value': state} for state in
-                     fluoride_data['State'].unique()],
+            options=state_options,
             value=None, clearable=True
         )], width=6)
     ]),
 
     dbc.Row([
-        dbc.Col([dcc.Graph(id='map', figure=px.choropleth(scope="usa"), style={'height': '40vh'})], width=6),
+        dbc.Col([dcc.Graph(id='map', figure=empty_map, style={'height': '40vh'})], width=6),
         dbc.Col([dash_table.DataTable(
             id='data-table',
+            data=[],
             columns=[
                 {"name": "State", "id": "State Name"},
                 {"name": "Year", "id": "Year"},
@@ -216,46 +585,98 @@ app.layout = dbc.Container([
             dcc.Loading(
                 id="loading-feedback",
                 type="circle",
+                # Keep streamed text visible under the spinner
+                overlay_style={'visibility': 'visible', 'opacity': 0.6},
                 children=html.Div(
                     id='ai-feedback',
+                    children=select_prompt,
                     style={'padding': '10px', 'background-color': '#f9f9f9'}
                 )
             )
         ])])], width=12)
-    ])
+    ]),
+
+    dcc.Store(id='prefetch-store'),
+    dcc.Store(id='selection-store', data={'year': None, 'state': None})
 ], fluid=True)
 
 
-# === Callback ===
+# === Callbacks ===
+@app.callback(
+    Output('prefetch-store', 'data'),
+    [Input('state-dropdown', 'value')],
+    [State('year-dropdown', 'value')],
+    prevent_initial_call=True
+)
+def prefetch_feedback(selected_state, selected_year):
+    # Once both dropdowns are set update_charts requests the feedback itself; only speculate ahead of that.
+    if not selected_state or selected_year:
+        return dash.no_update
+
+    prefetch_year = state_latest_year.get(selected_state)
+    feedback_inputs = state_year_stats.get((selected_state, prefetch_year))
+    if feedback_inputs is None:
+        return dash.no_update
+
+    # Bookkeeping lives in callback_cache because update_charts reads it from a background process
+    callback_cache.set(("prefetched", selected_state, int(prefetch_year)), True, expire=config["feedback_ttl"])
+    callback_cache.incr("prefetch_requested")
+    prefetch_executor.submit(ai_feedback_generator.generate_feedback, state_names[state_index[selected_state]],
+                             prefetch_year, *feedback_inputs)
+    return {'state': selected_state, 'year': int(prefetch_year)}
+
+
+@app.callback(
+    Output('selection-store', 'data'),
+    [Input('year-dropdown', 'value'), Input('state-dropdown', 'value')],
+    [State('selection-store', 'data')],
+    prevent_initial_call=True
+)
+def track_selection(selected_year, selected_state, last_selection):
+    # Runs in the server process and remembers each user's last selection, so spurious re-triggers with
+    # unchanged dropdowns stop here instead of forking a background job for update_charts.
+    selection = {'year': selected_year, 'state': selected_state}
+    if selection == last_selection:
+        raise PreventUpdate
+    return selection
+
+
 @app.callback(
     [Output('map', 'figure'), Output('data-table', 'data'), Output('ai-feedback', 'children')],
-    [Input('year-dropdown', 'value'), Input('state-dropdown', 'value')]
+    [Input('selection-store', 'data')],
+    background=True,
+    manager=background_callback_manager,
+    progress=[Output('ai-feedback', 'children')],
+    # The layout already holds the empty state
+    prevent_initial_call=True
 )
-def update_charts(selected_year, selected_state):
+def update_charts(set_progress, selection):
+    selected_year, selected_state = selection['year'], selection['state']
     if not selected_year or not selected_state:
-        return px.choropleth(scope="usa"), [], "Select a year and state to view data."
-
-    state_name = state_abbreviations[selected_state]
-    state_data_all_years = fluoride_data[fluoride_data['State'] == selected_state]
-    state_data_for_year = state_data_all_years[state_data_all_years['Year'] == selected_year]
+        return empty_map, [], select_prompt
 
-    fig_map = px.choropleth(
-        state_data_for_year, locations="State", locationmode="USA-states",
-        color="Highest Adjusted CWS Monthly Fluoride Average",
-        hover_name="State Name", scope="usa"
-    ).update_layout(height=450, geo=dict(projection_scale=1.2), showlegend=False)
+    state_name = state_names[state_index[selected_state]]
+    feedback_inputs = state_year_stats.get((selected_state, selected_year))
+    fig_map = map_figures.get((selected_state, selected_year), no_data_map)
 
-    table_data = state_data_all_years.to_dict('records')
+    table_data = state_records.get(selected_state, [])
 
-    if state_data_for_year.empty:
+    if feedback_inputs is None:
         feedback = f"No data for {state_name} in {selected_year}."
     else:
-        avg_fluoride = state_data_all_years['Highest Adjusted CWS Monthly Fluoride Average'].mean()
-        max_fluoride = state_data_for_year['Highest Adjusted CWS Monthly Fluoride Average'].max()
-        cws_name = state_data_for_year['CWS Adjusted Name'].iloc[0]
+        # Only a prefetch that finished before this job started saved a request; one still in flight means
+        # this job waits on it (or calls OpenAI itself), so it is not counted as a hit.
+        if callback_cache.pop(("prefetched", selected_state, selected_year), default=None):
+            if ai_feedback_generator.has_cached_feedback(state_name, selected_year, *feedback_inputs):
+                callback_cache.incr("prefetch_hits")
+            logging.info(f"Prefetch hit rate: {callback_cache.get('prefetch_hits', 0)}/"
+                         f"{callback_cache.get('prefetch_requested', 0)}")
 
-        feedback = ai_feedback_generator.generate_feedback(state_name, selected_year, max_fluoride, avg_fluoride,
-                                                           cws_name)
+        token = feedback_progress.set(set_progress)
+        try:
+            feedback = ai_feedback_generator.generate_feedback(state_name, selected_year, *feedback_inputs)
+        finally:
+            feedback_progress.reset(token)
 
     return fig_map, table_data, feedback
 